@@ -22,9 +22,15 @@ __version__ = __VERSION__ = '.'.join([ str(i) for i in VERSION])
 import os.path as osp
 import sys
 
-project_root = osp.abspath( osp.split( osp.abspath(__file__) )[0] )
-
-sys.path.append( osp.join( project_root, 'thirdparty'))
+## __file__ of an imported module is already absolute (Python >= 3.9),
+## no need for additional abspath() calls at every interpreter start
+project_root = osp.dirname(__file__)
+
+## only if something is actually bundled -- every sys.path entry is probed
+## by every later (unrelated) import that misses
+_thirdparty = osp.join( project_root, 'thirdparty')
+if osp.isdir(_thirdparty):
+    sys.path.append(_thirdparty)
 
 
 ## documentation hints:
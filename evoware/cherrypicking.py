@@ -15,13 +15,13 @@
 
 """Generate Cherry picking worklist from custom Excel tables"""
 
-import copy, collections
+import collections, functools, operator, sys
 
 from evoware import fileutil as F
+from evoware import util as U
 from evoware import tecan as W
 from evoware import plates as P
-
-import xlrd as X  ## third party dependency
+from evoware.excel import xlsreader as X
 
 class IndexFileError( Exception ):
     pass
@@ -29,6 +29,54 @@ class IndexFileError( Exception ):
 class DuplicateID(IndexFileError):
     pass
 
+## Cell values and IDs repeat a lot (plate IDs, sub-IDs, positions) -- cache 
+## their normalization. typed=True keeps e.g. True and 1 apart.
+@functools.lru_cache(maxsize=4096, typed=True)
+def _clean2str(x):
+    """convert integer floats to int, then strip to str"""
+    if type(x) is str:  ## most cells; no conversion needed
+        return x.strip()
+
+    if isinstance(x, float) and x.is_integer():
+        x = int(x)
+    
+    return str(x).strip()
+
+@functools.lru_cache(maxsize=4096, typed=True)
+def _cleanid(x):
+    """normalize single ID or sub-ID to stripped, lower case (interned) str"""
+    return sys.intern(_clean2str(x).lower())
+
+@functools.lru_cache(maxsize=4096)
+def _joinids(ids, types):
+    """
+    normalize tuple of ID and sub-ID(s) to 'ID#subID'; types is only part of 
+    the cache key so that e.g. (True,) and (1,) are not confused
+    """
+    ids = [ _cleanid(x) for x in ids ]
+    ids = [ x for x in ids if x ]  ## filter out empty strings but not '0'
+    ## interned so that index keys and lookup IDs are one and the same object
+    if len(ids) > 1:
+        return sys.intern('#'.join(ids))
+    return sys.intern(ids[0])
+
+def _lowerstrip(x):
+    """
+    normalize header or keyword cell to stripped lower case str; stripping
+    first avoids one string copy if there is no surrounding white space
+    """
+    if type(x) is str:
+        return x.strip().lower()
+    return str(x).strip().lower()
+
+@functools.lru_cache(maxsize=256)
+def _plateset(plates, types):
+    """
+    tuple of plate IDs -> frozenset of cleaned plate IDs; types only serves as
+    part of the cache key (see _joinids)
+    """
+    return frozenset( _clean2str(x) for x in plates )
+
 class BaseIndex(object):
     """
     Common base for Table (Excel) parsing.
@@ -106,6 +154,15 @@ class BaseIndex(object):
     HEADER_FIRST_VALUE = 'ID'
 
     _header0 = HEADER_FIRST_VALUE.lower()
+    
+    #: give up if the header row is not found after this many rows
+    MAX_PREHEADER_ROWS = 100
+    
+    #: (lower case) columns that must be present in the table header
+    _EXPECTED_COLS = ('id', 'plate', 'pos')
+    
+    #: columns with few distinct values; these are shared via sys.intern
+    INTERN_COLUMNS = ('plate', 'pos', 'sub-id', 'barcode')
 
     def __init__(self, plateformat=P.PlateFormat(96),
                  relaxedId=True):
@@ -120,19 +177,30 @@ class BaseIndex(object):
         self._plates = {'default':plateformat}
         
         self.relaxedId = relaxedId
+        ## main ID -> first registered 'ID#subID' key, for relaxed ID matching
+        self._mainids = {}
+        
+        ## pre-header row keyword (first cell, lower case) -> row handler
+        self._keyword_handlers = {'param': self._handleParam,
+                                  'format': self._handleFormat}
 
-    def parseParam(self, values, keyword='param'):
+    def parseParam(self, values, keyword='param', v0=None):
         """
         Extract "param, key, value" parameter from one row of values 
         (collected before the actual table header).
+        @param v0: str, first value already lower-cased and stripped [None]
         @return {key : value}, dict with one key:value pair or empty dict
         """
         if values:
-            v0 = values[0]
+            if v0 is None:
+                v0 = values[0]
+                v0 = v0.strip().lower() if type(v0) is str else ''
     
-            if v0 and type(v0) is str and v0.lower() == keyword:
+            if v0 == keyword:
                 try:
                     key = str(values[1]).strip()
+                    if not key:
+                        raise ValueError('empty parameter name')
                     value = self.intfloat2int(values[2])
                     return {key: value}
                 
@@ -141,55 +209,59 @@ class BaseIndex(object):
 
         return {}
     
-    def parsePlateformat(self, values):
-        r = self.parseParam(values, keyword='format')
+    def parsePlateformat(self, values, v0=None):
+        r = self.parseParam(values, keyword='format', v0=v0)
         if not r:
             return r
         
-        plate = list(r.keys())[0]
+        plate = next(iter(r))  ## single key, no need for a list of keys
         r[plate] = P.PlateFormat(r[plate])
         
         return r
         
 
-    def intfloat2int(self,x):
-        """convert floats like 1.0, 100.0, etc. to int *where applicable*"""
-        if type(x) is float:
-            if x % 1 == 0:
-                x = int(x)
-        return x
+    #: convert floats like 1.0, 100.0, etc. to int *where applicable*
+    #: (shared helper from evoware.util, no bound method per call)
+    intfloat2int = staticmethod(U.intfloat2int)
 
-    def clean2str(self, x):
-        """convert integer floats to int, then strip to unicode"""
-        x = self.intfloat2int(x)
-        
-        if type(x) is not str:
-            x = str(x)
-        
-        x = x.strip()
-        return x
+    #: convert integer floats to int, then strip to str (the cached helper
+    #: itself, which saves a Python-level method call per table cell)
+    clean2str = staticmethod(_clean2str)
     
-    def cleanEntry(self, d):
-        """convert and clean single part index dictionary (in place)"""
-        for key, value in d.items():
-            d[key] = self.clean2str(value)
-
-    def parsePreHeader(self, values):
-        r = self.parseParam(values)
-        self._params.update(r)
+    def parsePreHeader(self, values, v0=None):
+        """
+        Dispatch one row of values found before the table header to the 
+        handler registered for its first value (if any).
+        @param v0: str, first value already lower-cased and stripped [None]
+        """
+        if not values:
+            return
+        if v0 is None:
+            v0 = _lowerstrip(values[0])
         
-        r = self.parsePlateformat(values)
-        self._plates.update(r)
+        handler = self._keyword_handlers.get(v0)
+        if handler:
+            handler(values)
+
+    def _handleParam(self, values):
+        self._params.update( self.parseParam(values, v0='param') )
+    
+    def _handleFormat(self, values):
+        self._plates.update( self.parsePlateformat(values, v0='format') )
 
     def parseHeader(self, values):
         """
         @param values: [any], list of row values from input parser
         @return [str], list of table headers, lower case and stripped
-        @raise IndexFileError, if "construct" is missing from headers
+        @raise IndexFileError, if any of _EXPECTED_COLS is missing from headers
         """
-        r = [ str(x).lower().strip() for x in values ]
-        if not 'id' in r:
-            raise IndexFileError('cannot parse table header %r' % values)
+        ## interned: shared by all row dicts and hit by literal 'plate', 'pos'..
+        r = [ sys.intern(_lowerstrip(x)) for x in values ]
+        
+        missing = set(self._EXPECTED_COLS).difference(r)
+        if missing:
+            raise IndexFileError('cannot parse table header %r; missing: %s' \
+                                 % (values, ', '.join(sorted(missing))))
         
         return r
         
@@ -197,21 +269,29 @@ class BaseIndex(object):
         """
         Normalize input ID or ID + sub-ID tuple into single lower case string.
         @param ids: float or int or str or unicode or [float|int|str|unicode]
-        @return unicode, 'ID#subID' or 'ID'
+        @return str, 'ID#subID' or 'ID'
         """
-        if not type(ids) in [list, tuple]:
-            ids = [ids]
+        ## fast path for the most common cases -- a single str or, as passed 
+        ## by position() and addEntry(), a str with empty sub-ID
+        if type(ids) is tuple and len(ids) == 2 and ids[1] == '':
+            ids = ids[0]
+
+        if type(ids) is str:
+            r = _cleanid(ids)
+            if r:
+                return r
+
+        if type(ids) is not tuple:
+            ids = tuple(ids) if type(ids) is list else (ids,)
         
-        ids = [str(self.intfloat2int(x)).lower().strip() for x in ids]
-        ids = [ x for x in ids if x ]  ## filter out empty strings but not '0'
-        if len(ids) > 1:
-            return '#'.join(ids)
-        return ids[0]
+        return _joinids(ids, tuple(map(type, ids)))
     
-    def detectHeader(self, values):
-        if values and str(values[0]).lower().strip() == self._header0:
-            return True
-        return False
+    def detectHeader(self, values, v0=None):
+        if not values:
+            return False
+        if v0 is None:
+            v0 = _lowerstrip(values[0])
+        return v0 == self._header0
     
 
     def readExcel(self, fname):
@@ -220,38 +300,59 @@ class BaseIndex(object):
         @raise IOError, if file cannot be found (presumably)
         @raise IndexFileError, if header row cannot be found or interpreted
         """
-        book = X.open_workbook( F.absfile(fname) )
-        sheet = book.sheets()[0]
+        rows = X.sheetrows(fname)
         
         try:
-            row = 0
-            values = []
+            values, v0, n = [], None, 0
             ## iterate until there is a row starting with HEADER_FIRST_VALUE
             ## capture any "param, <key>, <value>" entries until then
-            while not self.detectHeader(values):
-                values = [ v for v in sheet.row_values(row) if v ] 
-                self.parsePreHeader(values)
-                row += 1
+            while not self.detectHeader(values, v0):
+                if n > self.MAX_PREHEADER_ROWS:
+                    raise IndexError('no header within %i rows' % n)
+                values = X.trimrow( next(rows) )
+                n += 1
+                if values:
+                    ## normalize first cell once for header and keyword tests
+                    v0 = _lowerstrip(values[0])
+                    self.parsePreHeader(values, v0)
             
             ## parse table "header"
             keys = self.parseHeader(values)
             
-            i = 0
-            for row in range(row, sheet.nrows):
-                values = sheet.row_values(row) 
+        except (IndexError, StopIteration) as why:
+            raise IndexError('Invalid Index file (could not find header).')
+
+        ## ignore rows with empty first column; filter() tests them in C
+        return self._addRows(keys, filter(operator.itemgetter(0), rows))
     
-                ## ignore rows with empty first column
-                if values[0]:
-                    d = dict( zip( keys, values ) ) 
-                    self.cleanEntry(d)
-                    self.addEntry(d)
-                    i += 1
+    def _addRows(self, keys, rows):
+        """
+        Clean and add table rows to the index.
+        @param keys: [str], column titles as returned by parseHeader
+        @param rows: iterable of [any], row values in the order of keys
+        @return int, number of rows added
+        """
+        ## bound methods looked up once rather than per row
+        clean = self.clean2str
+        addEntry = self.addEntry
+        
+        i = 0
+        for values in rows:
+            ## clean whole row at once; map() keeps the loop in C
+            addEntry( dict( zip( keys, map(clean, values) ) ) )
+            i += 1
 
-            return i
+        return i
 
-        except IndexError as why:
-            raise IndexError('Invalid Index file (could not find header).')
-    
+
+    def internEntry(self, d):
+        """
+        Replace str values of INTERN_COLUMNS by interned copies (in place) so 
+        that e.g. the same plate ID is stored only once for all entries.
+        """
+        for key in self.INTERN_COLUMNS:
+            if type(d.get(key)) is str:
+                d[key] = sys.intern(d[key])
 
     def addEntry(self, d):
         """
@@ -264,22 +365,37 @@ class BaseIndex(object):
         if part_id in self._index:
             raise DuplicateID('ID %s is used more than once.')
         
+        self.internEntry(d)
         self._index[ part_id ] = d
+        self._registerMainId(part_id)
+    
+    def _registerMainId(self, part_id):
+        """remember the first 'ID#subID' key registered for each main ID"""
+        main_id, sep, sub_id = part_id.partition('#')
+        if sep:
+            self._mainids.setdefault(main_id, part_id)
     
     def __getitem__(self, item):
         """
         SourceIndex[partID] -> [ {'plate':str, 'pos':str, 'barcode':str } ]
         @raise KeyError, if given ID doesn't match any registered part
         """
-        try:
+        ## plain str IDs (the usual case) skip the tuple handling of convertId
+        id = _cleanid(item) if type(item) is str else None
+        if not id:
             id = self.convertId(item)
-            return self._index[id]
-        except KeyError:
-            if self.relaxedId:
-                for key, value in self._index.items():
-                    if key.split('#')[0] == id:
-                        return value
-                raise
+        
+        ## single lookup; get() also leaves a defaultdict _index untouched
+        r = self._index.get(id)
+        if r is not None:
+            return r
+
+        if self.relaxedId:
+            key = self._mainids.get(id)
+            if key is not None:
+                return self._index[key]
+
+        raise KeyError(id)
     
     def __len__(self):
         """len(PickList) -> int, number of samples to pick"""
@@ -304,10 +420,14 @@ class BaseIndex(object):
         """
         id = self.convertId((id, subid))
         
-        if default is not None and not id in self._index:
-            return default
+        ## direct hit needs no second normalization via self[id]
+        r = self._index.get(id)
+        
+        if r is None:
+            if default is not None:
+                return default
+            r = self[id]  ## relaxed ID matching or KeyError
 
-        r = self[id]
         return r['plate'], r['pos']
     
     def plateFormat(self, plate=''):
@@ -327,25 +447,147 @@ class SourceIndex(BaseIndex):
     
     The filterByPlate() method returns a new SourceIndex containing only 
     entries from a given plate.
+    
+    Internally, entries are not stored as one dictionary per row but 
+    column-wise: SourceIndex._columns maps each column title to a list of 
+    values (one per entry, None if the column is missing for an entry) and
+    SourceIndex._index maps each part ID to a list of entry (row) numbers.
+    Entry dictionaries are only created on request.
     """
     
+    _EXPECTED_COLS = ('id', 'sub-id', 'plate', 'pos')
+    
+    def __init__(self, plateformat=P.PlateFormat(96), relaxedId=True):
+        """
+        @param plateformat: plates.PlateFormat, default microplate format
+        @param relaxedId: bool, fall back to matching by main ID only if sub-ID 
+                          is not given, for example:
+                              parts['Bba001'] may return parts['Bba001#a']
+        """
+        super(SourceIndex, self).__init__(plateformat=plateformat, 
+                                          relaxedId=relaxedId)
+        self._columns = {}  #: {column title : [values]}, one value per entry
+        self._index = collections.defaultdict(list)
+        self._ids = []      #: part ID of each entry
+        self._plate2rows = {}  #: {plate ID : [row numbers]}
+
     def addEntry(self, d):
         """
         Add new entry to part index.
         @param d: dict, {'id':str|int, 'sub-id':str|int, plate':str|int, 
                          'position':str|int, 'barcode':str|int }
         """
-        part_id = self.convertId((d['id'], d['sub-id']))
+        self.internEntry(d)
+        clean = self.clean2str
+        part_id = self._partId(clean(d['id']), clean(d['sub-id']))
+        row = len(self._ids)
+
+        for key, value in d.items():
+            if not key in self._columns:
+                self._columns[key] = [None] * row
+            self._columns[key].append(value)
+        
+        ## pad columns not present in this entry
+        for column in self._columns.values():
+            if len(column) == row:
+                column.append(None)
+
+        self._registerRow(part_id, d.get('plate'), row)
+
+    def _partId(self, id, subid):
+        """
+        Index key for already cleaned str ID and sub-ID (or None); same 
+        result as convertId but without its handling of other input types.
+        @return str, 'ID#subID' or 'ID' (lower case, interned)
+        @raise IndexError, if both ID and sub-ID are empty
+        """
+        part_id = (id or '').lower()
+        if part_id and subid:
+            return sys.intern(part_id + '#' + subid.lower())
+        if part_id:
+            return sys.intern(part_id)
+        return self.convertId( ('', subid or '') )  ## IndexError if empty
+
+    def _registerRow(self, part_id, plate, row):
+        """register part ID and plate of the entry with given row number"""
+        self._ids.append(part_id)
+        self._plate2rows.setdefault(plate, []).append(row)
+        self._index[part_id].append(row)
+        self._registerMainId(part_id)
+
+    def _addRows(self, keys, rows):
+        """
+        Same as BaseIndex._addRows but with cleaning and addEntry fused into
+        a single pass per row that writes values straight into the column
+        store (no intermediate dictionary). Sub-classes overriding addEntry
+        get the regular BaseIndex._addRows.
+        """
+        if type(self).addEntry is not SourceIndex.addEntry:
+            return super()._addRows(keys, rows)
+        
+        clean = self.clean2str
+        partId, registerRow = self._partId, self._registerRow
+        
+        ## value position of each column; like dict(zip(..)), the last of 
+        ## several identical titles wins
+        pos = dict( zip( keys, range(len(keys)) ) )
+        width = len(keys)
+        
+        row0 = row = len(self._ids)
+        for key in pos:
+            if not key in self._columns:
+                self._columns[key] = [None] * row0
+        
+        columns = [ (self._columns[key], i) for key, i in pos.items() ]
+        missing = [ column for key, column in self._columns.items() 
+                    if not key in pos ]
+        tointern = [ i for key, i in pos.items() if key in self.INTERN_COLUMNS ]
+        i_id, i_subid, i_plate = pos['id'], pos['sub-id'], pos['plate']
+        
+        for values in rows:
+            values = list( map(clean, values) )
+            if len(values) < width:  ## ragged row, missing cells are absent
+                values += [None] * (width - len(values))
+            
+            for i in tointern:
+                if values[i] is not None:
+                    values[i] = sys.intern(values[i])
+            
+            for column, i in columns:
+                column.append(values[i])
+            for column in missing:
+                column.append(None)
+            
+            registerRow(partId(values[i_id], values[i_subid]), 
+                        values[i_plate], row)
+            row += 1
+        
+        return row - row0
 
-        if not part_id in self._index:
-            self._index[part_id] = []
+    def _entry(self, row):
+        """create dictionary for entry with given row number"""
+        return { k : column[row] for k, column in self._columns.items() 
+                 if column[row] is not None }
 
-        self._index[ part_id ] += [ d ]
+    def __getitem__(self, item):
+        """
+        SourceIndex[partID] -> [ {'plate':str, 'pos':str, 'barcode':str } ]
+        @raise KeyError, if given ID doesn't match any registered part
+        """
+        rows = super(SourceIndex, self).__getitem__(item)
+        return [ self._entry(i) for i in rows ]
 
+    def values(self):
+        return [ [ self._entry(i) for i in rows ] 
+                 for rows in self._index.values() ]
+    
+    def items(self):
+        return [ (key, [ self._entry(i) for i in rows ])
+                 for key, rows in self._index.items() ]
     
     def __len__(self):
         """len(SourceIndex) -> int, number of registered positions"""
-        return sum( [ len(i) for i in self._index.values() ] )
+        return len(self._ids)  ## one ID per row, no need to sum up _index
     
     def position(self, id, subid='', plate=None, default=None):
         """
@@ -358,19 +600,30 @@ class SourceIndex(BaseIndex):
         """
         id = self.convertId((id, subid))
         
-        if default is not None and not id in self._index:
-            return default
+        ## no try/except self._index[id] -- it would insert into the defaultdict
+        rows = self._index.get(id)
+        
+        if rows is None:
+            if default is not None:
+                return default
+            rows = super(SourceIndex, self).__getitem__(id)  ## relaxed or error
 
-        r = self[id]
+        plates = self._columns['plate']
+        positions = self._columns['pos']
 
         if plate:
-            if not type(plate) in [list, tuple]:
-                plate = [plate]
-            plate = [self.clean2str(x) for x in plate]
-           
-            for d in r:
-                if d['plate'] in plate:
-                    return d['plate'], d['pos']
+            if type(plate) in [list, tuple]:
+                plate = tuple(plate)
+                plate = _plateset(plate, tuple(map(type, plate)))
+                for i in rows:
+                    if plates[i] in plate:
+                        return plates[i], positions[i]
+            else:
+                ## single plate ID, compare directly
+                plate = self.clean2str(plate)
+                for i in rows:
+                    if plates[i] == plate:
+                        return plates[i], positions[i]
             
             if default:
                 return default
@@ -378,23 +631,32 @@ class SourceIndex(BaseIndex):
             raise KeyError('no entry found for ID %s in plate(s) %r' % \
                   (id, plate))
         
-        return r[0]['plate'], r[0]['pos']
+        return plates[rows[0]], positions[rows[0]]
     
     def filterByPlate(self, plateID):
         """
+        Note: the parameter dictionary (._params) is shared (not copied) 
+        between the original and the new sub-index.
         @return SourceIndex, sub-index of all partIDs assigned to given plate
         """
         plateID = self.clean2str(plateID)
         
-        r = {}
-        for key, entries in self._index.items():
-            entries = [ e for e in entries if e['plate'] == plateID ]
-            if entries:
-                r[key] = entries
+        rows = self._plate2rows.get(plateID, [])
             
         p = SourceIndex()
-        p._index = r
-        p._params = copy.copy(self._params)
+        ## gather selected rows column by column; map() runs the loop in C
+        p._columns = { k : list( map(column.__getitem__, rows) ) 
+                       for k, column in self._columns.items() }
+        p._ids = list( map(self._ids.__getitem__, rows) )
+
+        for row, part_id in enumerate(p._ids):
+            p._index[part_id].append(row)
+            p._registerMainId(part_id)
+        
+        if rows:
+            p._plate2rows[plateID] = list(range(len(rows)))
+
+        p._params = self._params
         
         return p
     
@@ -428,29 +690,38 @@ class TargetIndex(BaseIndex):
         @param srccolumns: [str] | [(str,str),str], list of column headers
         @param volume: int, default volume for transfer
         """
+        ## the plain dict of BaseIndex keeps target table order (Python >= 3.7)
         super(TargetIndex, self).__init__()  
-        self._index = collections.OrderedDict()  ## replace unordered dict
         
         self.source_cols = self._clean_headers(srccolumns)
+        ## plain (non-nested) source columns for O(1) membership tests
+        self._source_colset = frozenset( c for c in self.source_cols 
+                                         if type(c) is str )
         self._volume = {'default':volume}
+        
+        self._keyword_handlers['volume'] = self._handleVolume
 
     def _clean_headers(self, values):
+        """
+        @param values: [str | (str,str)], column titles or groups of titles
+        @return [str | [str]], lower case and stripped titles
+        """
         r = []
         for v in values:
-            if type(v) in [list, tuple]:
-                r += [ self._clean_headers(v) ]
+            if isinstance(v, (list, tuple)):
+                r.append( [ _lowerstrip(x) for x in v ] )
             else:
-                r += [ str(v).lower().strip() ]
+                r.append( _lowerstrip(v) )
         return r
     
-    def parsePreHeader(self, values):
-        super(TargetIndex,self).parsePreHeader(values)
-        
-        r = self.parseParam(values, keyword='volume')
-        if r and not list(r.keys())[0] in self.source_cols + ['default']:
-            raise IndexFileError(('Volume definition "%s" does not match any source column.' %\
-                  list(r.keys())[0]) + ('\nExpected source columns are: %r' %\
-                  self.source_cols))
+    def _handleVolume(self, values):
+        r = self.parseParam(values, keyword='volume', v0='volume')
+        if r:
+            col = next(iter(r))
+            if col != 'default' and not col in self._source_colset:
+                raise IndexFileError(('Volume definition "%s" does not match any source column.' %\
+                      col) + ('\nExpected source columns are: %r' %\
+                      self.source_cols))
 
         self._volume.update(r)
     
@@ -503,45 +774,76 @@ class CherryWorklist(object):
         """close the internal worklist file handle"""
         self.wl.close()
     
-    def toWorklist(self, srccolumns=[], volume=None, byLabel=False):
+    def toWorklist(self, srccolumns=[], volume=None, byLabel=False,
+                   preserveOrder=False):
         """
         @param srccolumns - [str], source columns to be processed [all]
         @param volume - int, transfer volume if none is specified in table [None]
         @param byLabel - bool, use labware labels as IDs rather than 
                          ID/barcode [False]
+        @param preserveOrder - bool, emit transfers in target table order 
+                         rather than grouped by source plate and well [False]
         """
-        srccolumns = [s.strip() for s in srccolumns] or self.iTargets.source_cols
+        ## same normalization as TargetIndex; handles column groups, too
+        srccolumns = self.iTargets._clean_headers(srccolumns) \
+                     or self.iTargets.source_cols
+        
+        ## loop invariants bound once
+        dstFormat = self.iTargets.plateFormat
+        srcFormat = self.iParts.plateFormat
+        srcPosition = self.iParts.position
+        convertId = self.iParts.convertId
+        targets = self.iTargets.items()
+        
+        dst_cache = {}  ## target -> (plate, int position), shared by columns
         
         for col in srccolumns:
-            V = self.iTargets.volume(col, volume)
+            ## column groups can only be given the table's default volume
+            V = self.iTargets.volume(col if type(col) is str else None, volume)
             
             self.wl.comment('Processing source column %s' % col)
             
-            for target, d in self.iTargets.items():
+            transfers = []
+            
+            for target, d in targets:
                 
                 try:
-                    dst_plate, dst_pos = self.iTargets.position(target)
-                    
-                    if type(col) in [tuple,list]:
-                        src_id = [d[s] for s in col]
-                    src_id = d[col]
+                    if type(col) is str:
+                        src_id = d[col]
+                    else:
+                        ## column group, e.g. ['construct', 'clone'] -> 
+                        ## 'construct#clone' (or 'construct' if clone is empty)
+                        src_id = [ d[s] for s in col if d[s] ]
+                        src_id = convertId(src_id) if src_id else ''
                     
                     if src_id:
                         
-                        src_plate, src_pos = self.iParts.position(src_id)
-                        
-                        dst_format = self.iTargets.plateFormat(dst_plate)
-                        src_format = self.iParts.plateFormat(src_plate)
+                        src_plate, src_pos = srcPosition(src_id)
+                        src_pos = srcFormat(src_plate).pos2int(src_pos)
                         
-                        dst_pos = dst_format.pos2int(dst_pos)
-                        src_pos = src_format.pos2int(src_pos)
+                        ## target rows hold plate and position themselves,
+                        ## no need to look them up again via position()
+                        dst = dst_cache.get(target)
+                        if dst is None:
+                            dst_plate = d['plate']
+                            dst = dst_cache[target] = \
+                                (dst_plate, dstFormat(dst_plate).pos2int(d['pos']))
+                        dst_plate, dst_pos = dst
                         
-                        self.wl.transfer(src_plate, src_pos, dst_plate, dst_pos, 
-                                         V, byLabel=byLabel)
+                        transfers.append((src_plate, src_pos, dst_plate, dst_pos))
                 except P.PlateError as why:
                     raise IndexFileError('Error processing target record "%s":\n%s' \
                           % (target, why))
             
+            ## group aspirations by source plate and well; sort is stable so
+            ## targets sharing a source well keep their table order
+            if not preserveOrder:
+                transfers.sort(key=lambda t: (t[0], t[1]))
+            
+            transfer = self.wl.transfer
+            for src_plate, src_pos, dst_plate, dst_pos in transfers:
+                transfer(src_plate, src_pos, dst_plate, dst_pos, V, byLabel=byLabel)
+            
             self.wl.B()  ## force tip reset
         
     
@@ -581,15 +883,112 @@ class Test(testing.AutoTest):
         self.assertEqual(self.p['sb0101',2], self.p['sb0101#2'])
         self.assertEqual(len(self.p['sb0111']), 2)
         
+        ## relaxed ID matching returns the first registered sub-ID
+        self.assertEqual(self.p['SB0102'], self.p['sb0102#1'])
+        self.assertRaises(KeyError, self.p.__getitem__, 'sb0102#9')
+        self.p.relaxedId = False
+        self.assertRaises(KeyError, self.p.__getitem__, 'sb0102')
+        self.p.relaxedId = True
+        
         self.assertEqual(len(self.p), 27)
 
         self.assertEqual(self.p.position('sb0102', '2'), ('SB10', 'A5'))
         
         self.assertEqual(self.p.position('sb0102#2', plate='SB10'), 
                          self.p.position('sb0102', '2'))
+        self.assertEqual(self.p.position('sb0102#2', plate=['xx', 'SB10']), 
+                         ('SB10', 'A5'))
+        self.assertRaises(KeyError, self.p.position, 'sb0102#2', 
+                          plate=('xx', 'SB11'))
         
         self.assertEqual(self.p._plates['SB11'], P.PlateFormat(384))
 
+    def test_SourceIndex_addRows(self):
+        p = SourceIndex()
+        p.addEntry({'id':'sb0001', 'sub-id':'', 'plate':'SB09', 'pos':'A1',
+                    'barcode':'0001'})
+        self.assertEqual(p.readExcel(self.f_parts), 27)
+        
+        self.assertEqual(len(p), 28)
+        self.assertEqual(p['sb0001'][0]['barcode'], '0001')
+        self.assertEqual(p['sb0104#2'], 
+                         [{'id':'sb0104', 'sub-id':'2', 'plate':'SB11', 'pos':'8'}])
+        self.assertEqual(p.position('SB0104', 2), ('SB11', '8'))
+        self.assertEqual(p['sb0103'][0]['sub-id'], '')
+        self.assertTrue( all( len(c) == 28 for c in p._columns.values() ) )
+        
+        ## both paths give the same index
+        p2 = SourceIndex()
+        for entry in p.values():
+            for d in entry:
+                p2.addEntry(dict(d, **{'sub-id': d.get('sub-id', '')}))
+        self.assertEqual(p2._ids, p._ids)
+        self.assertEqual(p2._plate2rows, p._plate2rows)
+        
+        ## addEntry overrides are not bypassed by the fused path
+        class CountingIndex(SourceIndex):
+            n = 0
+            def addEntry(self, d):
+                self.n += 1
+                super().addEntry(d)
+        
+        c = CountingIndex()
+        self.assertEqual(c.readExcel(self.f_parts), 27)
+        self.assertEqual(c.n, 27)
+        self.assertEqual(c['sb0104#2'], p['sb0104#2'])
+
+    def test_SourceIndex_filterByPlate(self):
+        p = SourceIndex()
+        p.readExcel(self.f_parts)
+        p.addEntry({'id':'sb0104', 'sub-id':'1', 'plate':'SB11', 'pos':'2',
+                    'barcode':'0001'})
+        
+        self.f = p.filterByPlate('SB11')
+        self.assertEqual(len(self.f), 16)
+        self.assertEqual(self.f.position('sb0104', '1'), ('SB11', '1'))
+        self.assertEqual(self.f['sb0104#1'][1]['barcode'], '0001')
+        self.assertNotIn('barcode', self.f['sb0104#1'][0])
+        self.assertNotIn('sb0101#2', self.f.keys())
+        
+        self.assertRaises(KeyError, self.f.__getitem__, 'sb0101')
+        self.assertNotIn('sb0101', self.f.keys())
+        self.assertIs(self.f._params, p._params)
+        
+        ## unknown plates give an empty index and leave the original alone
+        self.assertEqual(len(p.filterByPlate('nonsense')), 0)
+        self.assertNotIn('nonsense', p._plate2rows)
+        
+    def test_readExcel_noheader(self):
+        p = SourceIndex()
+        p.MAX_PREHEADER_ROWS = 2  ## partslist.xls has params before header
+        self.assertRaises(IndexError, p.readExcel, self.f_parts)
+        
+    def test_parseHeader(self):
+        p = SourceIndex()
+        self.assertEqual(p.parseHeader(['ID', ' Sub-ID', 'plate', 'pos']),
+                         ['id', 'sub-id', 'plate', 'pos'])
+        self.assertRaises(IndexFileError, p.parseHeader, ['ID', 'plate', 'pos'])
+        
+    def test_convertId(self):
+        p = SourceIndex()
+        self.assertEqual(p.convertId(' SB0101 '), 'sb0101')
+        self.assertEqual(p.convertId(('SB0101', 2.0)), 'sb0101#2')
+        self.assertEqual(p.convertId(['SB0101', '']), 'sb0101')
+        self.assertEqual(p.convertId(('SB0101 ', '')), 'sb0101')
+        self.assertEqual(p.convertId((12.0, '')), '12')
+        self.assertRaises(IndexError, p.convertId, ('', ''))
+        self.assertEqual(p.convertId((12.0, 0)), '12#0')
+        ## cached results must not mix up equal-hashing values of other type
+        self.assertEqual(p.convertId((1,)), '1')
+        self.assertEqual(p.convertId((True,)), 'true')
+        
+    def test_SourceIndex_xlsx(self):
+        self.p2 = SourceIndex()
+        self.assertEqual(self.p2.readExcel(self.f_failparts), 69)
+        
+        self.assertEqual(self.p2.position('MTL00120'), ('PCRsource1', '4'))
+        self.assertEqual(self.p2._params['setting2'], 'value2')
+
     def test_targetIndex_simple(self):
         t = TargetIndex(srccolumns=[('construct','clone')])
         t.readExcel(self.f_simple)
@@ -601,7 +1000,35 @@ class Test(testing.AutoTest):
         self.assertTrue(t._volume['template'] == 2)
         self.assertEqual(t._volume['primer1'], 5)
         self.assertEqual(t._volume['primer2'], 5)
+        
+        self.assertRaises(IndexFileError, t.parsePreHeader, 
+                          ['volume', 'primer3', 5])
+        self.assertRaises(IndexFileError, t.parsePreHeader, 
+                          ['param', '', 'key', 5])
+        
+        self.assertEqual(t.position('SBF0101'), ('PCR-A', 'A2'))
+        self.assertEqual(t.position('nonsense', default=('', '')), ('', ''))
+        self.assertRaises(KeyError, t.position, 'nonsense')
     
+    def test_worklist_columngroup(self):
+        parts = SourceIndex()
+        parts.readExcel(self.f_parts)
+        
+        t = TargetIndex(srccolumns=[('construct','clone')], volume=5)
+        t.addEntry({'id':'1', 'sub-id':'', 'plate':'PCR-A', 'pos':'A1', 
+                    'construct':'sb0101', 'clone':'2'})
+        t.addEntry({'id':'2', 'sub-id':'', 'plate':'PCR-A', 'pos':'A2', 
+                    'construct':'sb0103', 'clone':''})
+        
+        cwl = CherryWorklist(self.f_worklist, t, parts)
+        cwl.toWorklist(srccolumns=[(' Construct', 'clone')], byLabel=True)
+        cwl.close()
+        
+        with open(self.f_worklist) as f:
+            asp = [ l.split(';')[1:5:3] for l in f if l.startswith('A;') ]
+        
+        self.assertEqual(asp, [['SB10', '1'], ['SB10', '96']])
+
     def test_generate_worklist(self):
         parts = SourceIndex()
         parts.readExcel(self.f_parts)
@@ -615,6 +1042,20 @@ class Test(testing.AutoTest):
         cwl.toWorklist(byLabel=True, volume=10)
         
         cwl.close()
+        
+        ## aspirations of each source column are grouped by plate and well
+        blocks = [[]]
+        with open(self.f_worklist) as f:
+            for l in f:
+                if l.startswith('A;'):
+                    fields = l.split(';')
+                    blocks[-1].append((fields[1], int(fields[4])))
+                elif l.startswith('B;'):
+                    blocks.append([])
+        
+        self.assertTrue(blocks[0])
+        for asp in blocks:
+            self.assertEqual(asp, sorted(asp))
                 
 
 if __name__ == '__main__':
@@ -15,19 +15,33 @@
 
 """TK / Windows user-notifications and dialog boxes"""
 
-import tkinter, tkinter.filedialog, tkinter.messagebox
 import sys, traceback, inspect
 import os
 
-import evoware.fileutil as F
+try:
+    import tkinter, tkinter.filedialog, tkinter.messagebox
+except ImportError:  ## e.g. headless Python builds without Tk
+    tkinter = None
 
-## create package-wide hidden window for unattached dialog boxes
-root = tkinter.Tk()
-root.withdraw()
+import evoware.fileutil as F
 
 class PyDialogError(Exception):
     pass
 
+## package-wide hidden window for unattached dialog boxes; created on first
+## use rather than at import time (slow, and fails without a display)
+_root = None
+
+def _get_root():
+    """create (once) and return hidden Tk root window"""
+    global _root
+    if _root is None:
+        if tkinter is None:
+            raise PyDialogError('Tk (tkinter) is not available.')
+        _root = tkinter.Tk()
+        _root.withdraw()
+    return _root
+
 ## see: http://stackoverflow.com/questions/9319317/quick-and-easy-file-dialog-in-python
 def askForFile(defaultextension='*.csv', 
                filetypes=(('Comma-separated values (CSV)', '*.csv'),
@@ -39,6 +53,7 @@ def askForFile(defaultextension='*.csv',
                newfile=False,
                title=None):
     """present simple Open File Dialog to user and return selected file."""
+    _get_root()
     options = dict(defaultextension=defaultextension, 
                filetypes=filetypes,
                initialdir=initialdir, 
@@ -57,19 +72,23 @@ def askForFile(defaultextension='*.csv',
 
 def info(title, message):
     """Display info dialog box to user"""
+    _get_root()
     tkinter.messagebox.showinfo(title, message)
 
 def warning(title, message):
     """Display warning dialog box to user"""
+    _get_root()
     tkinter.messagebox.showwarning(title, message)
 
 def error(title, message):
     """Display error dialog box to user"""
+    _get_root()
     tkinter.messagebox.showerror(title, message)
 
 def lastException(title=None):
     """Report last exception in a dialog box."""
     msg = __lastError()
+    _get_root()
     tkinter.messagebox.showerror(title= title or 'Python Exception', message=msg)
 
 def __lastError():
@@ -15,10 +15,44 @@
 
 import os.path as osp
 import os
+import atexit, queue
 import logging, logging.handlers
 
 import evoware.fileutil as F
 
+class _TaskQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler for the private logger of an `EvoTask`. Plain records are
+    merged into their final message in place -- without a Formatter pass
+    and without the defensive record copy, as no other handler sees them.
+    Records with exception or stack info take the regular path.
+    """
+    
+    def prepare(self, record):
+        if record.exc_info or record.stack_info or self.formatter:
+            return super().prepare(record)
+        
+        record.message = record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def _rotate_on_startup(path, backupCount=5):
+    """
+    Rename an existing log file to path.1 (and path.1 to path.2 and so on)
+    so that a fresh log can be started. Only backupCount old logs are kept.
+    """
+    if not osp.exists(path):
+        return
+    
+    for i in range(backupCount - 1, 0, -1):
+        src = '%s.%i' % (path, i)
+        if osp.exists(src):
+            os.replace(src, '%s.%i' % (path, i + 1))
+    
+    os.replace(path, path + '.1')
+
+
 class EvoTask(object):
     """
     Basic folder and log handling for Evo workflow tasks.
@@ -49,6 +83,14 @@ class EvoTask(object):
     This will create a new sub-folder 'evotask' within data/mynewproject or
     use the already existing sub-folder. It will create a new log file task.log
     within this sub-folder (rotating away previous logs)
+    
+    Log records are handed to a queue and written to the log file by a
+    background thread, so logging does not block the workflow on disk I/O.
+    INFO records are buffered and written in batches; warnings and errors
+    write out the buffer right away. Call task.flush() to write out all
+    pending records (e.g. before re-raising an exception) and task.close() 
+    to flush and release the log file (this also happens automatically at 
+    interpreter exit).
     """
     
     #: default task-specific sub-folder name for input and output. Override!
@@ -73,22 +115,66 @@ class EvoTask(object):
             logging.error('Project folder %s not found.' % self.f_project)
             raise IOError('Project folder %s not found.' % self.f_project)
         
-        self.f_task = self.prepareFolder()
+        self.f_task = self.prepareFolder(taskfolder)
         
         logfile = logfile or self.F_LOG
         if not osp.isabs(logfile):
             logfile = osp.join(self.f_task, logfile)
         
-        self.log = logging.getLogger('evo.' + self.__class__.__name__)
-        self.log.setLevel(loglevel)
+        ## private logger outside the logging manager's hierarchy: no global
+        ## registry lookup and no handlers shared between task instances
+        self.log = logging.Logger('evo.' + self.__class__.__name__, loglevel)
 
-        hdlr = logging.handlers.RotatingFileHandler(logfile,backupCount=5)
-        self.log.addHandler(hdlr)
-        self.log.propagate = False  ## don't copy to root log
+        ## rotate once per task rather than checking on every record
+        _rotate_on_startup(logfile, backupCount=5)
+        hdlr = logging.FileHandler(logfile, mode='w')
+        
+        ## collect records and write them to file in bursts of up to 512;
+        ## a WARNING or worse writes out the buffer immediately
+        self._buffer = logging.handlers.MemoryHandler(
+            512, flushLevel=logging.WARNING, target=hdlr)
+        
+        ## file I/O happens in a listener thread; logging calls only enqueue
+        q = queue.Queue(-1)
+        self._queuehandler = _TaskQueueHandler(q)
+        self._listener = logging.handlers.QueueListener(
+            q, self._buffer, respect_handler_level=True)
+        self._listener.start()
+        atexit.register(self.close)
+        
+        self.log.addHandler(self._queuehandler)
+        self.log.propagate = False  ## don't copy to root log (there is no parent)
         
         self.log.info('Task %s initiated in %s' % (self.__class__.__name__ , 
                                               self.f_task) )
 
+    def close(self):
+        """
+        Write out all pending log records, stop the log listener thread and
+        close the log file. Calling close() more than once is harmless.
+        """
+        if self._listener is None:
+            return
+        
+        self._listener.stop()  ## processes remaining records first
+        self.log.removeHandler(self._queuehandler)
+        self._buffer.flush()
+        self._buffer.target.close()
+        self._buffer.close()
+        
+        self._listener = None
+        atexit.unregister(self.close)  ## don't keep closed tasks alive
+    
+    def flush(self):
+        """
+        Write all log records queued or buffered so far to the log file.
+        """
+        if self._listener is None:
+            return
+        
+        self._listener.stop()  ## hands over all queued records to the buffer
+        self._buffer.flush()
+        self._listener.start()
     
     def prepareFolder( self, taskfolder=None ):
         """
@@ -104,12 +190,17 @@ class EvoTask(object):
         r = osp.join(self.f_project, taskfolder)
         logging.info('Task folder is set to ' + r)
         
-        if not osp.isdir(r):
-            logging.info('Creating new folder ' + r)
+        ## let mkdir report existing / failed folders instead of stat-ing first
+        try:
             os.mkdir(r)
-        
-        if not osp.isdir(r):
-            msg = 'Could not create task folder %r.' % r
+            logging.info('Created new folder ' + r)
+        except FileExistsError:
+            if not osp.isdir(r):
+                msg = 'Task folder %r exists but is not a directory.' % r
+                logging.error(msg)
+                raise IOError(msg)
+        except OSError as why:
+            msg = 'Could not create task folder %r: %s' % (r, why)
             logging.error(msg)
             raise IOError(msg)
         
@@ -145,6 +236,91 @@ class Test(testing.AutoTest):
         
         self.assertTrue(osp.exists(t.f_task), 'no task folder')
         self.assertTrue(osp.exists(osp.join(t.f_task, t.F_LOG)), 'no log file')
+        
+        t.log.info('closing task')
+        t.close()
+        t.close()
+        
+        with open(osp.join(t.f_task, t.F_LOG)) as f:
+            lines = f.readlines()
+        self.assertEqual(lines[-1].strip(), 'closing task')
+        self.assertFalse(t._queuehandler in t.log.handlers)
+    
+    def test_close_releases_task(self):
+        import gc, weakref
+        
+        t = EvoTask(projectfolder=self.f_project)
+        ref = weakref.ref(t)
+        t.close()
+        del t
+        gc.collect()
+        self.assertIsNone(ref())
+    
+    def test_flush(self):
+        t = EvoTask(projectfolder=self.f_project)
+        flog = osp.join(t.f_task, t.F_LOG)
+        
+        t.log.info('buffered')
+        t.flush()
+        with open(flog) as f:
+            self.assertEqual(f.readlines()[-1].strip(), 'buffered')
+        
+        t.log.info('still logging after flush')
+        t.close()
+        with open(flog) as f:
+            self.assertEqual(f.readlines()[-1].strip(), 
+                             'still logging after flush')
+    
+    def test_logformat(self):
+        t = EvoTask(projectfolder=self.f_project)
+        t.log.info('%i samples on %s', 96, 'plateA')
+        try:
+            raise ValueError('oops')
+        except ValueError:
+            t.log.exception('failed')
+        t.close()
+        
+        with open(osp.join(t.f_task, t.F_LOG)) as f:
+            lines = f.read().splitlines()
+        
+        self.assertIn('96 samples on plateA', lines)
+        self.assertIn('ValueError: oops', lines)
+    
+    def test_private_logger(self):
+        t1 = EvoTask(projectfolder=self.f_project, taskfolder='t1')
+        t2 = EvoTask(projectfolder=self.f_project, taskfolder='t2')
+        t1.log.info('only in t1')
+        t1.close()
+        t2.close()
+        
+        self.assertTrue(t1.log is not t2.log)
+        with open(osp.join(t2.f_task, t2.F_LOG)) as f:
+            self.assertFalse('only in t1' in f.read())
+    
+    def test_logrotation(self):
+        for i in range(3):
+            t = EvoTask(projectfolder=self.f_project)
+            t.log.info('task %i' % i)
+            t.close()
+        
+        flog = osp.join(t.f_task, t.F_LOG)
+        self.assertTrue(osp.exists(flog + '.2'))
+        self.assertFalse(osp.exists(flog + '.3'))
+        
+        with open(flog + '.1') as f:
+            self.assertEqual(f.readlines()[-1].strip(), 'task 1')
+    
+    def test_prepareFolder(self):
+        t = EvoTask(projectfolder=self.f_project, taskfolder='sub')
+        t.close()
+        self.assertEqual(t.f_task, osp.join(self.f_project, 'sub'))
+        
+        ## existing folder is re-used
+        self.assertEqual(t.prepareFolder('sub'), t.f_task)
+        
+        open(osp.join(self.f_project, 'notadir'), 'w').close()
+        with self.assertRaises(IOError):
+            t.prepareFolder('notadir')
 
 if __name__ == '__main__':
     
@@ -58,6 +58,9 @@ class DistributionXlsReader(X.XlsReader):
         super(DistributionXlsReader,self).__init__(**kwarg)
         self.reagents = []
         self.volumes = {}
+        
+        self._keyword_handlers[K.volume] = self.parseVolumeParam
+        self._keyword_handlers[K.reagent] = self._handleReagent
     
     def parseReagentParam(self, values, keyword=K.reagent):
         if values:
@@ -66,9 +69,11 @@ class DistributionXlsReader(X.XlsReader):
             if v0 and isinstance(v0, str) and v0.lower() == keyword:
                 try:
                     key = str(values[1]).strip()
+                    if not key:
+                        raise ValueError('empty reagent ID')
                     return {'ID':key, 'plate':values[2], 'pos':values[3]}
                 except Exception as error:
-                    raise ExcelFormatError('cannot parse reagent record: %r' \
+                    raise X.ExcelFormatError('cannot parse reagent record: %r' \
                           % values)
         return {}
             
@@ -79,20 +84,17 @@ class DistributionXlsReader(X.XlsReader):
             if v0 and isinstance(v0, str) and v0.lower() == keyword:
                 try:
                     key = str(values[1]).strip()
+                    if not key:
+                        raise ValueError('empty volume key')
                     self.volumes[key] = float(values[2])
                     return True
                 
                 except Exception as error:
-                    raise ExcelFormatError('cannot parse volume record: %r' \
+                    raise X.ExcelFormatError('cannot parse volume record: %r' \
                           % values)
         return False
     
-    def parsePreHeader(self, values):
-        super(DistributionXlsReader, self).parsePreHeader(values)
-        
-        if self.parseVolumeParam(values):
-            return
-
+    def _handleReagent(self, values):
         rdict = self.parseReagentParam(values)
         if rdict:
             self.reagents.append( rdict )
@@ -142,6 +144,46 @@ class Test(testing.AutoTest):
         s, v = targets[6].sourceIndex()['master']
         self.assertEqual(v, 0)
         self.assertEqual(s.plate.preferredID(), 'reservoirB')
+    
+    def test_iter_rows(self):
+        from evoware.sampleconverters import DistributionConverter
+        import evoware.samples as S
+        
+        xls = DistributionXlsReader()
+        rows = xls.iter_rows(self.f_xls)
+        self.assertEqual(len(xls.reagents), 2)  ## pre-header parsed already
+        
+        converter = DistributionConverter(reagents=xls.reagents)
+        targets = S.SampleList(rows, converter=converter)
+        
+        self.assertEqual(len(targets), 10)
+        self.assertEqual(len(xls.rows), 0)
+    
+    def test_parsePreHeader(self):
+        xls = DistributionXlsReader()
+        xls.parsePreHeader(['Volume', 'buffer01', 10.0])
+        xls.parsePreHeader(['reagent', 'master', 'R1', 2])
+        xls.parsePreHeader(['param', 'key', 1.0])
+        xls.parsePreHeader([12.0, 'unknown'])
+        xls.parsePreHeader(['comment', 'ignored'])
+        
+        self.assertEqual(xls.volumes, {'buffer01': 10.0})
+        self.assertEqual(xls.reagents, 
+                         [{'ID': 'master', 'plate': 'R1', 'pos': 2}])
+        self.assertEqual(xls.params, {'key': 1})
+        
+        with self.assertRaises(X.ExcelFormatError):
+            xls.parsePreHeader(['volume', 'buffer01'])
+        with self.assertRaises(X.ExcelFormatError):
+            xls.parsePreHeader(['reagent', '', 'water', 'R1', 1])
+        
+        ## empty cells within pre-header records keep their position
+        xls = DistributionXlsReader()
+        xls.parseRows([['reagent', 'water', '', 3, '', ''],
+                       ['ID', 'plate', 'pos'],
+                       ['t1', 'T01', 1]])
+        self.assertEqual(xls.reagents, 
+                         [{'ID': 'water', 'plate': '', 'pos': 3}])
         
     
 if __name__ == '__main__':
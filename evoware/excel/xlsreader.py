@@ -14,7 +14,9 @@
 ##   limitations under the License.
 """Base Parser for Excel tables"""
 
-import xlrd as X  ## third party dependency
+import datetime, hashlib, pickle
+import operator
+import os, os.path as osp
 
 import evoware as E
 import evoware.fileutil as F
@@ -23,9 +25,183 @@ import evoware.excel.keywords as K
 
 from evoware.plates import PlateFormat, PlateError, Plate
 
+## optional, much faster (Rust-based) reader for .xlsx files
+try:
+    import python_calamine
+except ImportError:
+    python_calamine = None
+
 class ExcelFormatError(IndexError):
     pass
 
+def trimrow(values):
+    """
+    Remove empty cells from the end of a row. Empty cells in between are 
+    kept so that all remaining values keep their position and e.g. an empty
+    plate cell in a "reagent, <ID>, <plate>, <pos>" record is not skipped.
+    
+    Args:
+        values (list): values of one row as returned by `sheetrows`
+    
+    Returns:
+        list: values up to and including the last non-empty cell
+    """
+    i = len(values)
+    while i and values[i-1] == '':
+        i -= 1
+    return values[:i]
+
+def sheetrows(fname):
+    """
+    Iterate over the rows of the first sheet in an Excel workbook.
+    
+    Legacy .xls files are read with xlrd. Excel 2007+ files (.xlsx, .xlsm) 
+    are read with the optional python-calamine package, if installed, or 
+    else streamed with openpyxl in read-only mode so that rows are only 
+    parsed as they are consumed. All readers return empty cells as '', 
+    whole numbers as int and dates as datetime; every row holds at least 
+    one value.
+    
+    Args:
+        fname (str): excel file name including path
+    
+    Yields:
+        list: values of one row
+    """
+    fname = F.absfile(fname)
+    yield from _rowreader(fname)(fname)
+
+def _rowreader(fname):
+    """the `sheetrows` implementation used for the given file name"""
+    if osp.splitext(fname)[1].lower() == '.xls':
+        return _xlrdrows
+    if python_calamine is not None:
+        return _calaminerows
+    return _openpyxlrows
+
+def _xlrdrows(fname):
+    """`sheetrows` implementation for legacy .xls files, based on xlrd"""
+    import xlrd as X  ## third party dependency, only needed for .xls
+
+    ## on_demand: only the first sheet is ever parsed
+    book = X.open_workbook(fname, on_demand=True)
+    try:
+        sheet = book.sheet_by_index(0)
+        number = X.XL_CELL_NUMBER
+
+        for row in range(sheet.nrows):
+            values = sheet.row_values(row)
+            
+            ## like openpyxl, return whole numbers as int, not float
+            types = sheet.row_types(row)
+            if number in types:
+                for i, t in enumerate(types):
+                    if t == number and values[i].is_integer():
+                        values[i] = int(values[i])
+            yield values
+    finally:
+        book.release_resources()
+
+def _openpyxlrows(fname):
+    """`sheetrows` implementation for .xlsx files, based on openpyxl"""
+    ## third party dependency; imported here as it is slow to import and 
+    ## only needed for .xlsx files
+    import openpyxl
+
+    ## keep_links=False: external workbook links are never needed for parsing
+    book = openpyxl.load_workbook(fname, read_only=True, data_only=True,
+                                  keep_links=False)
+    try:
+        for values in book.worksheets[0].iter_rows(values_only=True):
+            ## blank rows (common at the end of sheets with inflated 
+            ## dimensions) are detected in C, skipping per-cell conversion
+            if values.count(None) == len(values):
+                yield ['']
+            else:
+                yield [ '' if v is None else v for v in values ]
+    finally:
+        book.close()
+
+def _calaminerows(fname):
+    """
+    `sheetrows` implementation for .xlsx files, based on the optional 
+    python-calamine package. The whole sheet is parsed in one go; empty 
+    cells already come back as ''.
+    """
+    book = python_calamine.CalamineWorkbook.from_path(fname)
+    try:
+        ## skip_empty_area=False: keep leading empty rows and columns so that
+        ## the first column of each row is the same as with openpyxl
+        rows = book.get_sheet_by_index(0).to_python(skip_empty_area=False)
+    finally:
+        book.close()
+    
+    for values in rows:
+        ## like openpyxl, return whole numbers as int, not float, and
+        ## date-only cells as datetime, not date
+        types = set( map(type, values) )
+        if float in types or datetime.date in types:
+            values = [ _calamine2openpyxl(v) for v in values ]
+        yield values or ['']
+
+def _calamine2openpyxl(v):
+    if type(v) is float and v.is_integer():
+        return int(v)
+    if type(v) is datetime.date:
+        return datetime.datetime(v.year, v.month, v.day)
+    return v
+
+def cachedrows(fname, cachedir):
+    """
+    Get all rows of the first sheet of an Excel workbook, like `sheetrows`,
+    but re-use the result of an earlier parse of a file with identical
+    content. Parsed rows are pickled into cachedir under a hash of the file
+    content and of the reader backend (see `sheetrows`), so that edited 
+    files are never served from the cache. Failing to read or write the 
+    cache silently falls back to parsing.
+    
+    Args:
+        fname (str): excel file name including path
+        cachedir (str): folder for cached rows (created if needed)
+    
+    Returns:
+        list: of lists, values of each row
+    """
+    fname = F.absfile(fname)
+    
+    reader = _rowreader(fname)
+    
+    with open(fname, 'rb') as f:
+        key = hashlib.blake2b(f.read(), digest_size=20)
+    key.update(reader.__name__.encode())
+    fcache = osp.join(cachedir, key.hexdigest() + '.pickle')
+    
+    try:
+        with open(fcache, 'rb') as f:
+            return pickle.load(f)
+    except Exception:
+        pass  ## missing, corrupt or outdated cache file
+    
+    rows = list( reader(fname) )
+    
+    try:
+        os.makedirs(cachedir, exist_ok=True)
+        ## write + rename so that a concurrent reader never sees half a file
+        ftemp = '%s.%i.tmp' % (fcache, os.getpid())
+        with open(ftemp, 'wb') as f:
+            pickle.dump(rows, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(ftemp, fcache)
+    except OSError:
+        pass
+    
+    return rows
+
+def _readsheet(fname, cachedir=None):
+    """worker for `XlsReader.read_many`: all rows of the first sheet as list"""
+    if cachedir:
+        return cachedrows(fname, cachedir)
+    return list( sheetrows(fname) )
+
 class XlsReader(object):
     """
     Low level Excel table parsing. XlsReader extracts rows into a list of
@@ -136,9 +312,12 @@ class XlsReader(object):
     HEADER_FIRST_VALUE = 'ID'
 
     _header0 = HEADER_FIRST_VALUE.lower()
+    
+    #: give up if the header row is not found after this many rows
+    MAX_PREHEADER_ROWS = 100
 
     def __init__(self, plateIndex=E.plates.index, byLabel=True,
-                 defaultRackType='%i Well Microplate'):
+                 defaultRackType='%i Well Microplate', cachedir=None):
         """
         Constructor.
         
@@ -148,6 +327,8 @@ class XlsReader(object):
                 if False, all plate IDs are considered barcodes
             defaultRackType (str): labware type assigned to new plates,
                 if byLabel=False, see also Plate.__init__
+            cachedir (str): optional folder for caching parsed sheets
+                across runs, see `cachedrows` (default: no caching)
         """
         self.params = {} #: list of parameter records parsed from header
         self.rows = [] #: list of dict, one for each line from main body of the table 
@@ -155,16 +336,24 @@ class XlsReader(object):
         self.plateindex = plateIndex
         self.byLabel = byLabel
         self.defaultRackType = defaultRackType
+        self.cachedir = cachedir
+
+        ## lower-case pre-header keyword -> handler(values); sub-classes
+        ## register additional keywords here
+        self._keyword_handlers = {K.param: self._handleParam,
+                                  K.plateformat: self._handleFormat}
 
     def clean2str(self, x):
         """convert integer floats to int, then strip to unicode"""
-        x = U.intfloat2int(x)
+        ## this runs once per table cell; most cells already are str
+        if type(x) is str:
+            return x.strip()
 
-        if type(x) is not str:
-            x = str(x)
+        ## inlined U.intfloat2int
+        if isinstance(x, float) and x.is_integer():
+            x = int(x)
 
-        x = x.strip()
-        return x
+        return str(x).strip()
 
     def parseParam(self, values, keyword=K.param):
         """
@@ -182,6 +371,8 @@ class XlsReader(object):
             if v0 and isinstance(v0, str) and v0.lower() == keyword:
                 try:
                     key = str(values[1]).strip()
+                    if not key:
+                        raise ValueError('empty parameter name')
                     value = U.intfloat2int(values[2])
                     return {key: value}
 
@@ -198,6 +389,8 @@ class XlsReader(object):
             if v0 and isinstance(v0, str) and v0.lower() == keyword:
                 try:
                     key = str(values[1]).strip()
+                    if not key:
+                        raise ValueError('empty plate ID')
                     r = {'ID':key, 'wells':values[2]}
                     if len(values) > 3:
                         r['racktype'] = str(values[3]).strip()
@@ -236,11 +429,27 @@ class XlsReader(object):
     
 
     def parsePreHeader(self, values):
-        r = self.parseParam(values)
-        self.params.update(r)
+        """
+        Dispatch one row preceding the table header to the handler registered
+        for its first value (keyword) in `_keyword_handlers`. Rows without a
+        known keyword are ignored.
         
-        r = self.parsePlateformat(values)
-        self.plateindex.update(r)
+        Values are read by position: only trailing empty cells are removed
+        (see `trimrow`), so an empty cell in the middle of a record counts
+        as an (empty) value. Records with an empty key cell, for example 
+        "param | | key | value", raise `ExcelFormatError`.
+        """
+        v0 = values[0] if values else None
+        if type(v0) is str:
+            handler = self._keyword_handlers.get(v0.lower())
+            if handler:
+                handler(values)
+
+    def _handleParam(self, values):
+        self.params.update( self.parseParam(values) )
+
+    def _handleFormat(self, values):
+        self.plateindex.update( self.parsePlateformat(values) )
 
     def detectHeader(self, values):
         if values and str(values[0]).lower().strip() == self._header0:
@@ -274,37 +483,141 @@ class XlsReader(object):
             IOError: if file cannot be found (presumably)
             `ExcelFormatError`: if header row cannot be found or interpreted
         """
-        book = X.open_workbook( F.absfile(fname) )
-        sheet = book.sheets()[0]
+        return self.parseRows( self._sheetrows(fname) )
 
-        try:
-            row = 0
-            values = []
-            ## iterate until there is a row starting with HEADER_FIRST_VALUE
-            ## capture any "param, <key>, <value>" entries until then
-            while not self.detectHeader(values):
-                values = [ v for v in sheet.row_values(row) if v ] 
-                self.parsePreHeader(values)
-                row += 1
-    
-            ## parse table "header"
-            keys = self.parseHeader(values)
-    
-            i = 0
-            for row in range(row, sheet.nrows):
-                values = sheet.row_values(row) 
-    
-                ## ignore rows with empty first column
-                if values[0]:
-                    d = dict( zip( keys, values ) ) 
-                    self.cleanEntry(d)
-                    self.addEntry(d)
-                    i += 1
-    
-            return i
+    def _sheetrows(self, fname):
+        """rows of the first sheet, from cache if `cachedir` is set"""
+        if self.cachedir:
+            return cachedrows(fname, self.cachedir)
+        return sheetrows(fname)
+
+    def iter_rows(self, fname):
+        """
+        Stream the table body of an Excel file as row dictionaries, without 
+        adding them to the internal list of rows. Pre-header records (params,
+        plate formats, reagents etc.) and the table header are parsed right 
+        away, as with `read`; body rows are only parsed as they are consumed.
+        For example:
+        
+        >>> reader = DistributionXlsReader()
+        >>> rows = reader.iter_rows('distribution.xlsx')
+        >>> converter = DistributionConverter(reagents=reader.reagents)
+        >>> targets = SampleList(rows, converter=converter)
+        
+        Args:
+            fname (str) excel file name including path
+        
+        Returns:
+            iterator: of dict, one for each line from main body of the table
+        
+        Raises:
+            `ExcelFormatError`: if header row cannot be found or interpreted
+        """
+        rows = iter( self._sheetrows(fname) )
+        keys = self._parseHead(rows)
+        return self._iterBody(keys, rows)
+
+    def read_many(self, fnames, processes=None):
+        """
+        Like calling `read` for each file in turn, but the (CPU-bound) Excel
+        parsing runs in parallel worker processes. Pre-header records and
+        table rows are then processed in the given file order. Starting the
+        workers has a noticeable cost, so this only pays off for several
+        large files.
+        
+        Args:
+            fnames ([str]): excel file names including path
+            processes (int): maximum number of worker processes 
+                (default: number of CPUs)
+        
+        Returns:
+            int: number of rows added from all files
+        
+        Raises:
+            `ExcelFormatError`: if header row cannot be found or interpreted
+        """
+        import concurrent.futures  ## only needed here
+        
+        fnames = list(fnames)
+        cachedirs = [self.cachedir] * len(fnames)
+        
+        with concurrent.futures.ProcessPoolExecutor(processes) as pool:
+            sheets = list( pool.map(_readsheet, fnames, cachedirs) )
+        
+        return sum( self.parseRows(rows) for rows in sheets )
+
+    def parseRows(self, rows):
+        """
+        Parse pre-header records, table header and table body from rows as
+        returned by `sheetrows`. Table rows are appended to the internal list
+        of rows. See `read`.
+        
+        Args:
+            rows (iterable): of lists, values of each row of a sheet
+        
+        Returns:
+            int: number of rows added
+        """
+        rows = iter(rows)
+        keys = self._parseHead(rows)
+        
+        addEntry = self.addEntry  ## bound method looked up once
+        
+        i = 0
+        for d in self._iterBody(keys, rows):
+            addEntry(d)
+            i += 1
     
-        except ExcelFormatError as why:
-            raise ExcelFormatError('Invalid Excel file (could not find header).')
+        return i
+
+    def _parseHead(self, rows):
+        """
+        Consume rows up to and including the table header from iterator
+        rows, parsing any pre-header records on the way.
+        
+        Returns:
+            [str]: table headers, see `parseHeader`
+        """
+        values, n = [], 0
+        ## iterate until there is a row starting with HEADER_FIRST_VALUE
+        ## capture any "param, <key>, <value>" entries until then;
+        ## errors in these records propagate with their own message
+        while not self.detectHeader(values):
+            if n > self.MAX_PREHEADER_ROWS:
+                raise ExcelFormatError('Invalid Excel file (no header within '
+                                       'the first %i rows).' % n)
+            try:
+                values = trimrow( next(rows) )
+            except StopIteration:
+                raise ExcelFormatError(
+                    'Invalid Excel file (could not find header).') from None
+            n += 1
+            if values:
+                self.parsePreHeader(values)
+
+        ## parse table "header"
+        return self.parseHeader(values)
+
+    def _iterBody(self, keys, rows):
+        """generator: cleaned row dict for each remaining row of iterator rows"""
+        ## continue with the same iterator, each row is read only once;
+        ## ignore rows with empty first column; filter() tests them in C
+        rows = filter(operator.itemgetter(0), rows)
+        
+        if type(self).cleanEntry is not XlsReader.cleanEntry:
+            ## sub-class overrides cleanEntry: hand it the raw row dict
+            cleanEntry = self.cleanEntry
+            for values in rows:
+                d = dict( zip( keys, values ) )
+                cleanEntry(d)
+                yield d
+            return
+        
+        clean2str = self.clean2str  ## bound method looked up once
+        
+        for values in rows:
+            ## same result as cleanEntry but cleaned while building the dict
+            yield dict( zip( keys, map( clean2str, values ) ) )
 
     def addEntry(self, d):
         """
@@ -313,10 +626,13 @@ class XlsReader(object):
         Args:
             d (dict): dictionary representing one row
         """
-        self.rows  += [ d ]
+        self.rows.append( d )
 
     def cleanEntry(self, d):
-        """convert and clean single row dictionary (in place)"""
+        """
+        convert and clean single row dictionary (in place). Override this 
+        (or `clean2str`) to customize how table values are converted.
+        """
         for key, value in d.items():
             d[key] = self.clean2str(value)
     
@@ -354,6 +670,7 @@ class Test(testing.AutoTest):
         self.f_parts = F.testRoot('partslist.xls')
         self.f_primers = F.testRoot('primers.xls')
         self.f_distribute = F.testRoot('distribution.xls')
+        self.f_xlsx = F.testRoot('partslist_assembly.xlsx')
 
     def cleanUp(self):
         """Called after all tests"""
@@ -375,6 +692,124 @@ class Test(testing.AutoTest):
         self.assertEqual(self.r.plateFormat('SB11'), PlateFormat(384))
         self.assertEqual(self.r.plateFormat(''), PlateFormat(96))
         
+    def test_sheetrows(self):
+        rows = list( sheetrows(self.f_parts) )
+        ## partslist.xls stores sub-IDs and some positions as numbers
+        self.assertEqual(rows[4], ['format', 'SB11', 384, ''])
+        self.assertEqual(rows[15], ['sb0104', 1, 'SB11', 1])
+        self.assertIs(type(rows[15][1]), int)
+        self.assertTrue( all(rows) )
+    
+    def test_sheetrows_types(self):
+        import openpyxl, tempfile
+        
+        self.assertIs(_rowreader(self.f_parts), _xlrdrows)
+        
+        f = osp.join(tempfile.mkdtemp(prefix='test_xlstypes_'), 'types.xlsx')
+        try:
+            book = openpyxl.Workbook()
+            book.active.append(['ID', 'date', 'flag', 'n', 'x'])
+            book.active.append(['a', datetime.date(2024, 1, 1), True, 2.0, 
+                                1.5])
+            book.save(f)
+            
+            rows = list( sheetrows(f) )
+            self.assertEqual(rows[1], ['a', datetime.datetime(2024, 1, 1), 
+                                       True, 2, 1.5])
+            self.assertIs(type(rows[1][2]), bool)
+            self.assertEqual(list(_openpyxlrows(f)), rows)
+            
+            r = XlsReader()
+            r.read(f)
+            self.assertEqual(r.rows[0]['date'], '2024-01-01 00:00:00')
+            self.assertEqual(r.rows[0]['flag'], 'True')
+        finally:
+            F.tryRemove(osp.dirname(f), tree=True)
+    
+    def test_cachedrows(self):
+        import tempfile
+        cachedir = tempfile.mkdtemp(prefix='test_xlscache_')
+        try:
+            rows = list( sheetrows(self.f_parts) )
+            self.assertEqual(cachedrows(self.f_parts, cachedir), rows)
+            self.assertEqual(len(os.listdir(cachedir)), 1)
+            self.assertEqual(cachedrows(self.f_parts, cachedir), rows)
+            
+            ## unreadable cache content is ignored and replaced
+            fcache = osp.join(cachedir, os.listdir(cachedir)[0])
+            for garbage in [b'', b'not a pickle', 
+                            b'cevoware.excel.xlsreader\nNoSuchName\n.']:
+                with open(fcache, 'wb') as f:
+                    f.write(garbage)
+                self.assertEqual(cachedrows(self.f_parts, cachedir), rows)
+            
+            r = XlsReader(cachedir=cachedir)
+            r.read(self.f_parts)
+            self.assertEqual(len(r.rows), 27)
+        finally:
+            F.tryRemove(cachedir, tree=True)
+    
+    def test_read_errors(self):
+        r = XlsReader()
+        with self.assertRaisesRegex(ExcelFormatError, 'could not find header'):
+            r.parseRows([['param', 'a', 1], ['no', 'header']])
+        
+        ## the header search stops after MAX_PREHEADER_ROWS rows
+        rows = [['']] * r.MAX_PREHEADER_ROWS + [['ID', 'plate']]
+        self.assertEqual(r.parseRows(rows), 0)
+        with self.assertRaisesRegex(ExcelFormatError, 'no header within'):
+            r.parseRows([['']] + rows)
+        
+        ## error in a pre-header record is reported as such
+        with self.assertRaisesRegex(ExcelFormatError, 'cannot parse parameter'):
+            r.parseRows([['param', 'a'], ['ID', 'plate']])
+    
+    def test_cleanEntry(self):
+        class UpperReader(XlsReader):
+            def cleanEntry(self, d):
+                super().cleanEntry(d)
+                d['plate'] = d['plate'].upper()
+        
+        r = UpperReader()
+        r.parseRows([['ID', 'plate'], ['a', ' sb10 ']])
+        self.assertEqual(r.rows, [{'id': 'a', 'plate': 'SB10'}])
+    
+    def test_read_many(self):
+        r1 = XlsReader()
+        r1.read(self.f_parts)
+        r1.read(self.f_primers)
+        
+        r2 = XlsReader()
+        n = r2.read_many([self.f_parts, self.f_primers], processes=2)
+        
+        self.assertEqual(n, len(r1))
+        self.assertEqual(r2.rows, r1.rows)
+        self.assertEqual(r2.params, r1.params)
+    
+    def test_trimrow(self):
+        self.assertEqual(trimrow(['param', '', 'n', 0, '', 0.0, '', '']), 
+                         ['param', '', 'n', 0, '', 0.0])
+        self.assertEqual(trimrow(['', '']), [])
+        self.assertEqual(trimrow(['', 'a']), ['', 'a'])
+        
+        r = XlsReader()
+        r.parseRows([['param', 'n', 0.0, '', ''], ['ID']])
+        self.assertEqual(r.params['n'], 0)
+        
+        ## empty cells within a pre-header record keep their position;
+        ## an empty key cell is an error rather than a parameter ''
+        for row in (['param', '', 'm', 1], ['format', '', 384]):
+            with self.assertRaises(ExcelFormatError):
+                r.parseRows([row, ['ID']])
+        self.assertFalse('' in r.params)
+        
+    def test_xlsreader_xlsx(self):
+        self.r4 = XlsReader()
+        self.assertEqual(self.r4.read(self.f_xlsx), 69)
+        
+        self.assertEqual(self.r4.params['setting2'], 'value2')
+        self.assertEqual(self.r4.rows[1]['pos'], '4')
+        
     def test_xlsreader_barcode(self):
         self.r2 = XlsReader(byLabel=False)
         self.r2.read(self.f_parts)
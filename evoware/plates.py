@@ -15,6 +15,7 @@
 """microplate handling"""
 
 import numpy as N
+import functools
 import re, string
 
 class PlateError(Exception):
@@ -23,6 +24,26 @@ class PlateError(Exception):
 class PlateIndexError(PlateError):
     pass
 
+@functools.lru_cache(maxsize=None)
+def _position_tables(nx, ny):
+    """
+    Pre-compute well coordinates for a plate with nx columns and ny rows.
+    
+    Returns:
+        tuple: (tuple_of_str, dict) -- coordinates ('A1', 'B1', ...) in Tecan
+            order and dict mapping upper and lower case coordinates to
+            Tecan position; both are empty if there are more rows than
+            letters
+    """
+    if ny > len(string.ascii_uppercase):
+        return (), {}
+    
+    int2human = tuple( string.ascii_uppercase[row] + str(col + 1)
+                       for col in range(nx) for row in range(ny) )
+    pos2int = { h : i for i, h in enumerate(int2human, 1) }
+    pos2int.update( { h.lower() : i for i, h in enumerate(int2human, 1) } )
+    return int2human, pos2int
+
 
 class PlateFormat(object):
     """
@@ -87,6 +108,9 @@ class PlateFormat(object):
         if self.nx * self.ny != self.n:
             raise PlateError('invalid plate format: %r x %r != %r' % \
                              (self.nx, self.ny, self.n))
+        
+        ## lookup tables for the common 'A1' <-> 1 conversions
+        self._int2human, self._pos2int = _position_tables(self.nx, self.ny)
     
     
     def str2tuple(self, pos):
@@ -117,6 +141,13 @@ class PlateFormat(object):
         Raises:
             PlateError: if the resulting position is outside well number
         """
+        if type(pos) is int and 0 < pos <= self.n:
+            return pos
+        
+        r = self._pos2int.get(pos) if type(pos) is str else None
+        if r:
+            return r
+        
         if type(pos) in [int, float]:
             letter, number = '', int(pos)
         else:
@@ -148,6 +179,9 @@ class PlateFormat(object):
         """
         assert type(pos) is int
         
+        if 0 < pos <= len(self._int2human):
+            return self._int2human[pos - 1]
+        
         col = int((pos-1) / self.ny)
         row = int((pos-1) % self.ny)
         
@@ -343,6 +377,29 @@ class Plate(object):
         return self.barcode
 
 
+class _FallbackPlate(Plate):
+    """
+    Read-only `Plate` shared by all samples created without plate, see
+    `PlateIndex.defaultplate`. Any attempt to modify it raises `PlateError`
+    as the change would silently apply to all these samples.
+    """
+    
+    _frozen = False
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._frozen = True
+    
+    def __setattr__(self, name, value):
+        if self._frozen:
+            raise PlateError('cannot modify the shared default plate; assign '
+                             'PlateIndex.defaultplate or defaultformat instead')
+        super().__setattr__(name, value)
+    
+    def __delattr__(self, name):
+        raise PlateError('cannot modify the shared default plate')
+
+
 class PlateIndex(dict):
     """
     Dictionary of `Plate` instances. Currently, no assumption is made about
@@ -377,6 +434,9 @@ class PlateIndex(dict):
     #: dict key for entry with default plate (format)
     DEFAULT_KEY = 'default'
     
+    #: shared fallback plate used while there is no DEFAULT_KEY entry
+    _fallbackplate = None
+    
     def __setitem__(self, key, value):
         if not isinstance(value, Plate):
             raise TypeError('cannot assign %r to PlateIndex' % value)
@@ -385,9 +445,24 @@ class PlateIndex(dict):
     
     @property
     def defaultplate(self):
+        """
+        Plate registered under DEFAULT_KEY or, if there is none, one shared
+        96 well fallback plate (created once, not per call).
+        
+        Note:
+            The fallback plate is shared by all samples created without
+            plate and is therefore read-only -- e.g. 
+            ``index.defaultplate.format = ...`` raises `PlateError`. Assign
+            `defaultplate` or `defaultformat` instead, which registers a new
+            plate under DEFAULT_KEY.
+        """
         if self.DEFAULT_KEY in self:
             return self[self.DEFAULT_KEY]
-        return Plate(rackLabel=self.DEFAULT_KEY, format=PlateFormat(96))
+        
+        if self._fallbackplate is None:
+            self._fallbackplate = _FallbackPlate(rackLabel=self.DEFAULT_KEY, 
+                                                 format=PlateFormat(96))
+        return self._fallbackplate
 
     @defaultplate.setter
     def defaultplate(self, plate):
@@ -434,12 +509,18 @@ class PlateIndex(dict):
         Returns:
             `PlateFormat`
         """
-        if not key in self:
+        plate = self.get(key)  ## one lookup instead of `in` plus []
+        if plate is None:
             if default:
                 return default
             return self.defaultformat
 
-        return self[key].format
+        return plate.format
+    
+    def clear(self):
+        """remove all plates and reset the fallback default plate"""
+        super().clear()
+        self._fallbackplate = None
     
     def getcreate(self, k, d=None):
         """
@@ -541,6 +622,11 @@ class Test(testing.AutoTest):
         self.assertEqual(f.pos2int('A2'), 9)
         self.assertEqual(f.pos2int('A12'), 89)
         self.assertEqual(f.pos2int('h12'), 96)
+        self.assertEqual(f.pos2int('A02'), 9)
+        self.assertEqual(f.pos2int('10'), 10)
+        self.assertEqual(f.pos2int(10.0), 10)
+        self.assertRaises(PlateError, f.pos2int, 97)
+        self.assertRaises(PlateError, f.pos2int, 'A13')
     
     def test_plateformat_human2int(self):
         f = PlateFormat(96)
@@ -551,6 +637,11 @@ class Test(testing.AutoTest):
             pos = f.pos2int(t)
             human = f.int2human(pos)
             self.assertEqual(t, human)
+        
+        f = PlateFormat(384)
+        for pos in range(1, 385):
+            self.assertEqual(f.pos2int(f.int2human(pos)), pos)
+        self.assertEqual(f.int2human(384), 'P24')
     
     def test_plateformat_eq(self):
         f1 = PlateFormat(96)
@@ -617,12 +708,39 @@ class Test(testing.AutoTest):
         
         self.assertEqual(d.getformat('plate01'), PlateFormat(2))
         self.assertEqual(d.getformat('unknown'), d.defaultformat)
+        self.assertIs(d.defaultplate, d.defaultplate)
+        self.assertFalse(PlateIndex.DEFAULT_KEY in d)
         d.defaultformat = PlateFormat(384)
         self.assertEqual(d.getformat('unknown'), PlateFormat(384))
         
         p1 = d.getcreate('testplateA')
         p2 = d.getcreate('testplateA')
         self.assertTrue(p1 is p2)
+    
+    def test_defaultplate(self):
+        d = PlateIndex()
+        fallback = d.defaultplate
+        self.assertIs(d.defaultplate, fallback)
+        self.assertFalse(PlateIndex.DEFAULT_KEY in d)
+        
+        ## the shared fallback plate is read-only
+        with self.assertRaises(PlateError):
+            fallback.format = PlateFormat(384)
+        with self.assertRaises(PlateError):
+            fallback.rackLabel = 'other'
+        with self.assertRaises(PlateError):
+            fallback.rackType = '%i Well Deepwell'
+        self.assertEqual(fallback.rackLabel, PlateIndex.DEFAULT_KEY)
+        
+        ## setting a default format registers a new plate and leaves the
+        ## shared fallback (and samples holding it) untouched
+        d.defaultformat = PlateFormat(384)
+        self.assertEqual(d[PlateIndex.DEFAULT_KEY].format, PlateFormat(384))
+        self.assertIsNot(d.defaultplate, fallback)
+        self.assertEqual(fallback.format, PlateFormat(96))
+        
+        d.clear()
+        self.assertEqual(d.defaultformat, PlateFormat(96))
 
 
 if __name__ == '__main__':
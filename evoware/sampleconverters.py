@@ -44,33 +44,57 @@ class SampleConverter(object):
         """
         self.plateindex = plateindex
         
+        ## input dict key -> (field name, clean2str needed?), see cleanDict
+        self._keymap = {}
+        
     def clean2str(self, x):
         """convert integer floats to int (if applicable), then strip to string"""
-        x = U.intfloat2int(x)
+        ## this runs once per table cell; most cells already are str
+        if type(x) is str:
+            return x.strip()
+
+        ## inlined U.intfloat2int
+        if isinstance(x, float) and x.is_integer():
+            x = int(x)
 
-        if type(x) is not str:
-            x = str(x)
+        return str(x).strip()
 
-        x = x.strip()
-        return x
 
+    def fieldmap(self, key):
+        """
+        Map an input dict key to its standard field name.
+        
+        Args:
+            key (str): input key, e.g. an Excel column header
+        Returns:
+            tuple: (str_field, bool) field name and whether values of this
+                field are subject to `clean2str`
+        """
+        field = key.lower()
+        field = self.key2field.get(field, field)
+        return field, field in self.fields2strclean
 
     def cleanDict(self, d):
         """
         Pre-processing of dictionary values.
+        
+        The key -> field mapping is looked up only once per distinct key
+        (i.e. once per column of an input table) and then re-used.
         """
         r = {}
+        keymap = self._keymap
+        clean2str = self.clean2str
         
         for key, value in d.items():
-            key = key.lower()
+            try:
+                field, clean = keymap[key]
+            except KeyError:
+                field, clean = keymap[key] = self.fieldmap(key)
             
-            if key in self.key2field:
-                key = self.key2field[key]
+            if clean:
+                value = clean2str(value)
             
-            if key in self.fields2strclean:
-                value = self.clean2str(value)
-            
-            r[key] = value
+            r[field] = value
 
         return r
 
@@ -327,6 +351,13 @@ class Test(testing.AutoTest):
         
         s2 = Sample(id='BBa1000#1', plate=P.index['plateA'], pos=1)
         self.assertEqual(s1, s2)
+        
+        c = SampleConverter()
+        for i in range(2):  ## 2nd round uses cached key mapping
+            d = c.cleanDict({'ID': 12.0, 'Sub-ID': ' a', 'Position': 3, 
+                             'conc': 2.0})
+            self.assertEqual(d, {'id': '12', 'subid': 'a', 'pos': 3, 
+                                 'conc': 2.0})
 
     
     def test_pickingconverter(self):        
@@ -13,7 +13,7 @@
 ##   See the License for the specific language governing permissions and
 ##   limitations under the License.
 from collections.abc import MutableSequence
-import numbers
+import numbers, operator
 
 import evoware as E
 import evoware.util as U
@@ -22,6 +22,12 @@ from evoware.plates import PlateFormat, PlateError, Plate
 class SampleError(Exception):
     pass
 
+def _clean_idpart(x):
+    """ID component -> stripped str; floats like 1.0 become '1'"""
+    if type(x) is str:
+        return x.strip()
+    return str(U.intfloat2int(x)).strip()
+
 def normalize_sample_id(ids):
         """
         Normalizes input ID or (ID, sub-ID) tuple to standard ('ID', 'sub-ID')
@@ -38,13 +44,22 @@ def normalize_sample_id(ids):
         Returns:
             tuple: (str_ID, str_subID) or (str_ID, '') 
         """
-        if type(ids) is str and '#' in ids:
+        if type(ids) is str:
+            _id, sep, _subid = ids.partition('#')
+            if not sep:
+                return ids.strip(), ''  ## fast path for the common plain ID
+            
+            _id, _subid = _id.strip(), _subid.strip()
+            if _id and _subid and not '#' in _subid:
+                return _id, _subid  ## fast path for plain 'ID#subID'
+            
             ids = ids.split('#')
 
-        if type(ids) not in [tuple, list]:
+        elif type(ids) not in (tuple, list):
             ids = (ids,)
 
-        ids = [str(U.intfloat2int(x)).strip() for x in ids]
+        ids = [ x.strip() if type(x) is str else str(U.intfloat2int(x)).strip()
+                for x in ids ]
         ids = [ x for x in ids if x ]  ## filter out empty strings but not '0'
         
         _id = ids[0] if len(ids) > 0 else ''
@@ -125,6 +140,10 @@ class Sample(object):
         True
     """
     
+    ## '__dict__' keeps the arbitrary extra fields (see `updateFields`) working
+    __slots__ = ('_id', '_subid', '_plate', '_pos', '_hashcache',
+                 '_fullidcache', '__dict__')
+    
     def __init__(self, id='', subid='', plate=None, pos=0,
                  **kwargs):
         """
@@ -137,7 +156,7 @@ class Sample(object):
                    default plate instance from ``evoware.plates.index`` will be
                    assigned.
         """        
-        self._subid = str(U.intfloat2int(subid)).strip()
+        self._subid = _clean_idpart(subid)
         
         self._id = ''
         if self._subid:
@@ -148,10 +167,12 @@ class Sample(object):
         if isinstance(plate, str):
             plate = E.plates.index.getcreate(plate)
         
+        ## may be the shared, read-only fallback plate, see 
+        ## PlateIndex.defaultplate
         self._plate = plate or E.plates.index.defaultplate
         assert isinstance(self._plate, Plate)
         
-        self._pos = self.plateformat.pos2int(pos)
+        self._pos = self._plate.format.pos2int(pos)
         
         self._hashcache = None
         self._fullidcache = None
@@ -161,7 +182,8 @@ class Sample(object):
 
     def updateFields(self, **kwargs):
         """add additional fields to sample instance (used by constructor)"""
-        self.__dict__.update(kwargs)
+        if kwargs:  ## instance __dict__ is only allocated when needed
+            self.__dict__.update(kwargs)
 
     @property
     def id(self):
@@ -207,7 +229,7 @@ class Sample(object):
     @property
     def plateformat(self):
         """shortcut for sample.plate.format (readonly)"""
-        return self.plate.format
+        return self._plate.format
 
     @property
     def position2D(self):
@@ -215,7 +237,7 @@ class Sample(object):
         str (read-only), 'human readable' version of the well position. E.g.
         'A1', 'B2', 'H12', etc.
         """
-        return self.plateformat.int2human(self._pos)
+        return self._plate.format.int2human(self._pos)
 
     def _setid(self, ids):
         """
@@ -297,6 +319,8 @@ class Reaction(Sample):
                                   'reagent2' : (src2, 100.0)}
     """
     
+    __slots__ = ('sourcevolumes', '_sindex')
+    
     def __init__(self, **kwargs):
         """
         Keyword Args:
@@ -322,9 +346,11 @@ class Reaction(Sample):
         """
         assert isinstance(sourcevolumes, dict)
         
-        if len(sourcevolumes) > 0:
-            assert isinstance(list(sourcevolumes.keys())[0], Sample)
-            assert isinstance(list(sourcevolumes.values())[0], numbers.Number )
+        if __debug__ and sourcevolumes:
+            ## spot-check first item without copying keys and values to lists
+            sample, volume = next(iter(sourcevolumes.items()))
+            assert isinstance(sample, Sample)
+            assert isinstance(volume, numbers.Number)
             
         self.sourcevolumes = sourcevolumes
         
@@ -405,7 +431,7 @@ class SampleList(MutableSequence):
         return self._list[i]
     
     def insert(self, i, val):
-        assert isinstance(val, Sample) or isinstance(val, dict)
+        assert isinstance(val, (Sample, dict))
         val = self._converter.tosample(val)
         self._list.insert(i, val)
 
@@ -430,10 +456,10 @@ class SampleList(MutableSequence):
             dict: {'ID' : `Sample`}
         """
         r = {}
+        getkey = operator.attrgetter(keyfield)
+        
         for sample in self._list:
-            key = eval('sample.%s' % keyfield)
-            if not key in r:
-                r[key] = sample
+            r.setdefault(getkey(sample), sample)
                 
         return r
 
@@ -455,6 +481,7 @@ class SampleIndex:
         """
         self.relaxed = relaxed_id
         self._map = {}
+        self._mainids = {}  ## main ID -> first ID#subID, for relaxed lookup
         if initialdata:
             self.extend(initialdata)
 
@@ -474,6 +501,7 @@ class SampleIndex:
             raise ValueError('%r not allowed in SampleDict' % type(sample))
         
         self._map[ sample.fullid ] = sample
+        self._mainids.setdefault( sample.id, sample.fullid )
     
     def extend(self, samples):
         """
@@ -514,9 +542,7 @@ class SampleIndex:
             relaxed = self.relaxed
 
         if relaxed and not key in self._map:
-            for k in self._map.keys():
-                if k.split('#')[0] == key:
-                    return self._map[k]
+            key = self._mainids.get(key, key)
         
         try:
             return self._map[key]
@@ -551,12 +577,20 @@ class SampleIndex:
         """
         if type(key) is str:
             sample = self[key]
-            del self._map[sample.fullid]
+        elif isinstance(key, Sample):
+            sample = key
+        else:
+            raise ValueError('%r not allowed' % type(key))
         
-        if isinstance(key, Sample):
-            del self._map[key.fullid]
-
-        raise ValueError('%r not allowed' % type(key))
+        del self._map[sample.fullid]
+        
+        ## point relaxed lookup to the next sample with the same main ID
+        if self._mainids.get(sample.id) == sample.fullid:
+            del self._mainids[sample.id]
+            for s in self._map.values():
+                if s.id == sample.id:
+                    self._mainids[s.id] = s.fullid
+                    break
 
 
 ######################
@@ -598,6 +632,28 @@ class Test(testing.AutoTest):
         
         s2 = Sample(id='BBa1000#1', plate=Plate('plateA'), pos=1)
         self.assertEqual(s2.subid, '1')
+        
+        s3 = Sample(id='BBa4000', pos=1, temperature=25)
+        self.assertEqual(s3.temperature, 25)
+        self.assertFalse(s2.__dict__)
+        
+        ## samples without plate share a plate that cannot be modified
+        self.assertIs(s.plate, s3.plate)
+        with self.assertRaises(E.plates.PlateError):
+            s.plate.format = PlateFormat(384)
+        self.assertEqual(s3.plateformat, PlateFormat(96))
+    
+    def test_normalize_sample_id(self):
+        self.assertEqual(normalize_sample_id(' BBa1 '), ('BBa1', ''))
+        self.assertEqual(normalize_sample_id(''), ('', ''))
+        self.assertEqual(normalize_sample_id('BBa1#a'), ('BBa1', 'a'))
+        self.assertEqual(normalize_sample_id(' BBa1 # a '), ('BBa1', 'a'))
+        self.assertEqual(normalize_sample_id('#a'), ('a', ''))
+        self.assertEqual(normalize_sample_id('BBa1##a'), ('BBa1', 'a'))
+        self.assertEqual(normalize_sample_id('BBa1#a#b'), ('BBa1', 'a'))
+        self.assertEqual(normalize_sample_id(12.0), ('12', ''))
+        self.assertEqual(normalize_sample_id(('', 'a')), ('a', ''))
+        self.assertEqual(normalize_sample_id(['BBa1', 0]), ('BBa1', '0'))
     
     def test_sample_hashing(self):
         s1 = Sample('s1', 'a', 'plateA', 1)
@@ -673,6 +729,9 @@ class Test(testing.AutoTest):
         self.assertEqual(len(sindex), len(l)-3) # 3 duplicate ID entries
         self.assertEqual(sindex['sb0102#2'], l[3])
         self.assertEqual(sindex['sb0103'], l[4])
+        
+        sindex = l.toSampleIndex(keyfield='plate.rackLabel')
+        self.assertEqual(sindex['testplate'], l[0])
 
     def test_samplelist_unknownplates(self):
         """
@@ -718,6 +777,14 @@ class Test(testing.AutoTest):
         
         ## partslist.xls contains 3 duplicate entries with identical ID#subID
         self.assertEqual(len(index), len(primers) + len(srcsamples) -3)
+        
+        ## relaxed lookup moves on to the next sub-ID after deletion
+        index.add(S.Sample('sb9999#a', pos=1))
+        index.add(S.Sample('sb9999#b', pos=2))
+        del index['sb9999']
+        self.assertEqual(index['sb9999'].fullid, 'sb9999#b')
+        del index[index['sb9999#b']]
+        self.assertRaises(KeyError, index.get, 'sb9999')
 
 
 if __name__ == '__main__':
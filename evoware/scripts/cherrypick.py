@@ -113,12 +113,12 @@ def run(options):
             logging.error('missing option: ' + str(why))
             U.scriptusage(options, doc=__doc__, force=True)
         
-        srcsamples = S.SampleList()
-        
+        ## one reader collects the rows of all source files
+        srcxls = X.XlsReader(byLabel=options['useLabel'])
         for f in options['src']:
-            srcxls = X.XlsReader(byLabel=options['useLabel'])
             srcxls.read( f )
-            srcsamples += S.SampleList(srcxls.rows)
+        
+        srcsamples = S.SampleList(srcxls.rows)
             
         xls = X.DistributionXlsReader(byLabel=options['useLabel'])
         xls.read(options['i'])
@@ -123,10 +123,11 @@ def run( options ):
         reagents = xls.reagents
         
         if 'src' in options:
+            ## one reader collects the rows of all source files
+            srcxls = X.XlsReader(byLabel=options['useLabel'])
             for f in options['src']:
-                srcxls = X.XlsReader(byLabel=options['useLabel'])
                 srcxls.read( f )
-                reagents.extend( S.SampleList(srcxls.rows) )
+            reagents.extend( S.SampleList(srcxls.rows) )
             
         columns = options['columns']
         
@@ -18,7 +18,6 @@
 __all__ = ['Worklist', 'WorklistException','SampleWorklist']  ## result of `import *`
 
 from evoware import fileutil as F
-from evoware import dialogs as D
 from evoware import plates as P
 from evoware import samples as S
 
@@ -164,7 +163,7 @@ class Worklist(object):
             try:
                 self._f = open(self.fname, mode='w')
             except:
-                if self.reportErrors: D.lastException()
+                if self.reportErrors: self._reportError()
                 raise
         return self._f
 
@@ -193,7 +192,15 @@ class Worklist(object):
         
         ## report last Exception to user
         if type and self.reportErrors:
-            D.lastException()
+            self._reportError()
+    
+    def _reportError(self):
+        """
+        Report last exception in a dialog box. evoware.dialogs is only
+        imported here as it creates a (hidden) Tk window at import time.
+        """
+        from evoware import dialogs as D
+        D.lastException()
     
     def aspirate(self, rackID='', rackLabel='', rackType='', 
                  position=1, tubeID='', volume=0,
@@ -275,10 +282,10 @@ class Worklist(object):
         r = 'D;%s;%s;%s;%i;%s;%i;%s;%s;\n' % (rackLabel, rackID, rackType, position,
                                     tubeID, volume, liquidClass, tipMask)
         
-        self.f.write(r)
-        
         if wash:
-            self.f.write('W;\n')
+            r += 'W;\n'  ## one write call for both lines
+        
+        self.f.write(r)
     
     def D(self, rackID, position, volume, wash=True, byLabel=False, rackType=''):
         """
@@ -518,11 +525,14 @@ class SampleWorklist(Worklist):
             volume (int | float): volume to be transferred
             wash (bool): include wash / tip change statement after dispense
         """
-        self.A(src.plate.preferredID(), src.position, volume, 
-               byLabel=src.plate.byLabel(), rackType=src.plate.rackType)
+        ## plate is a property; resolve it once per sample
+        splate, dplate = src.plate, dst.plate
+        
+        self.A(splate.preferredID(), src.position, volume, 
+               byLabel=splate.byLabel(), rackType=splate.rackType)
         
-        self.D(dst.plate.preferredID(), dst.position, volume, wash=wash, 
-               byLabel=dst.plate.byLabel(), rackType=dst.plate.rackType)        
+        self.D(dplate.preferredID(), dst.position, volume, wash=wash, 
+               byLabel=dplate.byLabel(), rackType=dplate.rackType)        
     
     def getReagentKeys(self, targetsamples):
         """
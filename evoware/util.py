@@ -30,7 +30,7 @@ def tolist(x):
 
 def intfloat2int(x):
     """convert floats like 1.0, 100.0, etc. to int, if possible"""
-    if type(x) is float and x % 1 == 0:
+    if isinstance(x, float) and x.is_integer():
         return int(x)
     return x
 
@@ -42,7 +42,8 @@ setup(
     provides=['evoware'],
 
     ## available on PyPi
-    install_requires=['xlrd','numpy','sphinx','sphinx_rtd_theme'],
+    install_requires=['xlrd','openpyxl','numpy','sphinx','sphinx_rtd_theme'],
+    extras_require={'fast': ['python-calamine']},
     packages=find_packages(exclude=EXCLUDE_FROM_PACKAGES),
     include_package_data=True,
     scripts = ['evoware/scripts/pcrsetup.py',